@@ -1,6 +1,9 @@
 
 import os
-from sqlalchemy import create_engine
+import json
+import orjson
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -11,8 +14,20 @@ load_dotenv()
 # Database URL configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data_validator.db")
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+def json_loads(data):
+    """Decode a JSON column value with orjson, falling back to the stdlib
+    parser for values orjson rejects, such as NaN stored by older versions"""
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+# Create SQLAlchemy engine, using orjson for JSON columns
+engine = create_engine(
+    DATABASE_URL,
+    json_serializer=lambda obj: orjson.dumps(obj).decode(),
+    json_deserializer=json_loads
+)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -33,6 +48,49 @@ from app.models.postgres import PostgresConnection
 from app.models.dataset import CsvDataset
 from app.models.validation import ValidationCheck, ValidationResult
 
+# Columns added to existing tables since they were first created, as
+# {table: {column: SQL type}}. They must be nullable, since existing rows
+# have no value for them.
+ADDED_COLUMNS = {
+    "csv_datasets": {
+        "file_path": "VARCHAR",
+        "columnar_path": "VARCHAR"
+    }
+}
+
+def add_missing_columns():
+    """Add columns that existing tables were created without"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+
+# JSON columns stored as JSONB on PostgreSQL, which tables created before
+# the switch have as json
+JSONB_COLUMNS = {
+    "csv_datasets": ["columns", "preview_data"]
+}
+
+def convert_jsonb_columns():
+    """Convert json columns of existing PostgreSQL tables to jsonb"""
+    if engine.dialect.name != "postgresql":
+        return
+    
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in JSONB_COLUMNS.items():
+            types = {column["name"]: column["type"] for column in inspector.get_columns(table)}
+            for column in columns:
+                if not isinstance(types.get(column), JSONB):
+                    conn.execute(text(
+                        f'ALTER TABLE {table} ALTER COLUMN "{column}" TYPE jsonb USING "{column}"::jsonb'
+                    ))
+
 def create_tables():
     """Create database tables"""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    convert_jsonb_columns()
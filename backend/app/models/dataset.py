@@ -1,18 +1,25 @@
 
 from sqlalchemy import Column, String, Integer, DateTime, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.database import Base
 
+# Stored as binary JSONB on PostgreSQL, plain JSON elsewhere
+JsonType = JSON().with_variant(JSONB(), "postgresql")
+
 class CsvDataset(Base):
     __tablename__ = "csv_datasets"
     
     id = Column(String, primary_key=True)
     name = Column(String, nullable=False)
     file_name = Column(String, nullable=False)
+    # Null for datasets uploaded before files were stored
+    file_path = Column(String, nullable=True)
+    columnar_path = Column(String, nullable=True)
     uploaded_at = Column(DateTime(timezone=True), default=func.now())
-    columns = Column(JSON, nullable=False)
+    columns = Column(JsonType, nullable=False)
     row_count = Column(Integer, nullable=False)
-    preview_data = Column(JSON, nullable=False)
+    preview_data = Column(JsonType, nullable=False)
     
     def to_dict(self):
         return {
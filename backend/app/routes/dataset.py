@@ -1,10 +1,22 @@
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
+from sqlalchemy import select, func, cast, Text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.orm import Session
 import uuid
+import logging
+import os
+import time
+from functools import lru_cache
+import numpy as np
+import orjson
 from datetime import datetime
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pacsv
+from pyarrow import feather
 import csv
 import json
 import io
@@ -19,28 +31,394 @@ from app.schemas.dataset import (
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+# Directory where uploaded CSV files are stored
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+
+# Size of the chunks used when streaming uploads to disk
+CHUNK_SIZE = 1 << 20
+
+# Multi-threaded CSV parsing in 4 MiB blocks
+READ_OPTIONS = pacsv.ReadOptions(use_threads=True, block_size=4 << 20)
+
+# Dictionary-encode low-cardinality string columns, storing each distinct
+# value once rather than once per row
+CONVERT_OPTIONS = pacsv.ConvertOptions(auto_dict_encode=True)
+
+# Single-threaded, so no blocks past the first are read ahead and parsed
+PREVIEW_READ_OPTIONS = pacsv.ReadOptions(use_threads=False, block_size=CHUNK_SIZE)
+
+# Cached analyses are dropped after this long
+CACHE_TTL_SECONDS = 2 * 60 * 60
+
+_cache_cleared_at = time.monotonic()
+
+def _position_map_path(file_path: str) -> str:
+    """Get the path of the line offset index stored next to a CSV file"""
+    return f"{file_path}.posmap"
+
+def _line_offsets(chunk: bytes, position: int, quote_parity: int):
+    """Get the absolute byte offsets at which new rows start within a chunk,
+    and the quote parity at the end of the chunk.
+    
+    Newlines inside quoted fields don't start a row. A byte is inside quotes
+    when an odd number of quote characters precede it, so the parity carried
+    over from earlier chunks is passed in and returned updated."""
+    data = np.frombuffer(chunk, dtype=np.uint8)
+    # Wrapping uint8 sums keep the parity, at one byte per element
+    quote_counts = np.cumsum(data == ord('"'), dtype=np.uint8) + np.uint8(quote_parity)
+    row_ends = (data == ord("\n")) & ((quote_counts & 1) == 0)
+    offsets = np.flatnonzero(row_ends) + (position + 1)
+    return offsets, int(quote_counts[-1] & 1) if len(data) else quote_parity
+
+def _mask_non_finite(array):
+    """Replace NaN and infinite values with nulls, which serialize as JSON null"""
+    if pa.types.is_floating(array.type):
+        return pc.if_else(pc.is_finite(array), array, None)
+    return array
+
+def _temporal_as_text(schema: pa.Schema) -> Optional[pacsv.ConvertOptions]:
+    """Get convert options that read a schema's date and time columns as
+    plain strings, or None if it has none"""
+    column_types = {
+        field.name: pa.string()
+        for field in schema
+        if pa.types.is_temporal(field.type)
+    }
+    return pacsv.ConvertOptions(column_types=column_types) if column_types else None
+
+def _to_records(data) -> list:
+    """Convert a record batch or table to JSON-friendly row dicts"""
+    columns = [_mask_non_finite(array).to_pylist() for array in data.columns]
+    names = data.schema.names
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+def _analyze_column(column: pa.ChunkedArray) -> dict:
+    """Compute summary statistics for a single column"""
+    # NaN and infinite values count as missing
+    column = _mask_non_finite(column)
+    
+    # Dictionary-encoded columns are reported by the type of their values
+    is_dictionary = pa.types.is_dictionary(column.type)
+    value_type = column.type.value_type if is_dictionary else column.type
+    
+    analysis = {
+        "type": str(value_type),
+        "missingValues": column.null_count
+    }
+    
+    if pa.types.is_null(value_type):
+        # Columns with no values at all (e.g. empty or header-only) are typed null
+        analysis["uniqueValues"] = 0
+    elif pa.types.is_string(value_type):
+        # A single hash pass gives distinct values (in first-seen order) and
+        # their frequencies, from which every string statistic is derived
+        counts = pc.value_counts(column)
+        counts = counts.filter(pc.is_valid(counts.field("values")))
+        values, frequencies = counts.flatten()
+        if is_dictionary:
+            values = values.cast(value_type)
+        
+        empty_index = pc.index(values, "").as_py()
+        
+        analysis["uniqueValues"] = len(values)
+        analysis["emptyValues"] = frequencies[empty_index].as_py() if empty_index >= 0 else 0
+        analysis["sampleValues"] = values[:5].to_pylist()
+    else:
+        try:
+            analysis["uniqueValues"] = pc.count_distinct(column).as_py()
+        except pa.ArrowNotImplementedError:
+            # Don't fail the whole analysis over a type without a hash kernel
+            analysis["uniqueValues"] = None
+    
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        min_max = pc.min_max(column)
+        analysis["min"] = min_max["min"].as_py()
+        analysis["max"] = min_max["max"].as_py()
+        analysis["mean"] = pc.mean(column).as_py()
+    
+    return analysis
+
+def _save_upload(source, file_path: str) -> int:
+    """Copy an uploaded file to disk in chunks, writing the byte offset of
+    every row start as raw int64 values to its position map, with the end
+    of the file as the last entry. Returns the number of offsets written."""
+    offset_count = 1
+    last_offset = 0
+    file_size = 0
+    quote_parity = 0
+    with open(file_path, "wb") as f, open(_position_map_path(file_path), "wb") as position_map:
+        np.zeros(1, dtype=np.int64).tofile(position_map)
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            f.write(chunk)
+            offsets, quote_parity = _line_offsets(chunk, file_size, quote_parity)
+            if len(offsets):
+                offsets.astype(np.int64, copy=False).tofile(position_map)
+                offset_count += len(offsets)
+                last_offset = int(offsets[-1])
+            file_size += len(chunk)
+        
+        if last_offset != file_size:
+            np.array([file_size], dtype=np.int64).tofile(position_map)
+            offset_count += 1
+    
+    return offset_count
+
+def _remove_file(file_path: Optional[str]):
+    """Remove a stored file if it exists"""
+    if not file_path:
+        return
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+def _advise(fd: int, advice: str):
+    """Give the kernel a hint about how a whole file will be accessed, where supported"""
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+
+def _read_csv(file_path: str) -> pa.Table:
+    """Parse a whole CSV file into a table"""
+    with open(file_path, "rb") as f:
+        # Readahead settings apply per open file, so parse through this one
+        _advise(f.fileno(), "POSIX_FADV_SEQUENTIAL")
+        table = pacsv.read_csv(f, read_options=READ_OPTIONS, convert_options=CONVERT_OPTIONS)
+    # Each block gets its own dictionary, but IPC files need one per column
+    return table.unify_dictionaries()
+
+def _write_columnar(file_path: str, columnar_path: str):
+    """Convert a stored CSV file to an uncompressed Arrow IPC (Feather) file"""
+    tmp_path = f"{columnar_path}.tmp"
+    try:
+        table = _read_csv(file_path)
+        # Uncompressed so the file can be memory-mapped without decoding
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, columnar_path)
+        
+        # The dataset was deleted while converting, so don't leave the copy behind
+        if not os.path.exists(file_path):
+            _remove_file(columnar_path)
+            return
+        
+        # The CSV is rarely read in full again, so drop its pages from the
+        # page cache rather than let them push out the memory-mapped files.
+        # Pages still waiting to be written can't be dropped, so flush first.
+        with open(file_path, "rb") as f:
+            os.fsync(f.fileno())
+            _advise(f.fileno(), "POSIX_FADV_DONTNEED")
+    except Exception:
+        # Analysis falls back to the CSV file if conversion fails
+        logger.exception("Failed to convert %s to %s", file_path, columnar_path)
+        _remove_file(tmp_path)
+
+def _column_types(columnar_path: Optional[str]) -> Optional[dict]:
+    """Get the column types of a dataset's Arrow copy, with dates and times as
+    text, or None if the copy isn't available"""
+    if not columnar_path or not os.path.exists(columnar_path):
+        return None
+    
+    with pa.memory_map(columnar_path) as source:
+        schema = pa.ipc.open_file(source).schema
+    
+    column_types = {}
+    for field in schema:
+        field_type = field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+        column_types[field.name] = pa.string() if pa.types.is_temporal(field_type) else field_type
+    return column_types
+
+def _read_rows(file_path: str, columnar_path: Optional[str], columns: list, start: int, n: int) -> list:
+    """Read up to n data rows of a CSV file, starting at row start"""
+    # Byte offset of every line start, with the end of the file last
+    offsets = np.memmap(_position_map_path(file_path), dtype=np.int64, mode="r")
+    line_count = len(offsets) - 1
+    
+    # Line 0 is the header
+    first_line = min(start + 1, line_count)
+    last_line = min(start + 1 + n, line_count)
+    begin, end = int(offsets[first_line]), int(offsets[last_line])
+    
+    if begin == end:
+        return []
+    
+    # Read and parse only the bytes of the requested rows
+    with open(file_path, "rb") as f:
+        f.seek(begin)
+        data = f.read(end - begin)
+    
+    read_options = pacsv.ReadOptions(column_names=columns)
+    
+    # Parse with the types of the whole dataset, so values don't change type
+    # from one page to the next
+    column_types = _column_types(columnar_path)
+    if column_types is not None:
+        table = pacsv.read_csv(
+            pa.BufferReader(data),
+            read_options=read_options,
+            convert_options=pacsv.ConvertOptions(column_types=column_types)
+        )
+        return _to_records(table)
+    
+    # Until the Arrow copy exists, types can only be inferred from these rows
+    table = pacsv.read_csv(pa.BufferReader(data), read_options=read_options)
+    
+    # Parse again so dates and timestamps keep the text they have in the file
+    convert_options = _temporal_as_text(table.schema)
+    if convert_options:
+        table = pacsv.read_csv(
+            pa.BufferReader(data),
+            read_options=read_options,
+            convert_options=convert_options
+        )
+    return _to_records(table)
+
+def _source_path(dataset: CsvDataset) -> str:
+    """Get the path of the best available copy of a dataset's data"""
+    if dataset.columnar_path and os.path.exists(dataset.columnar_path):
+        return dataset.columnar_path
+    return dataset.file_path
+
+def _load_table(file_path: str) -> pa.Table:
+    """Load a CSV or Arrow file as a table"""
+    if file_path.endswith(".arrow"):
+        # Memory-mapped, so the column buffers are backed by the page cache
+        return feather.read_table(file_path, memory_map=True)
+    return _read_csv(file_path)
+
+@lru_cache(maxsize=32)
+def _analyze_cached(file_path: str, mtime: float) -> dict:
+    """Analyze every column of a dataset file, cached per file version"""
+    table = _load_table(file_path)
+    return {
+        name: _analyze_column(column)
+        for name, column in zip(table.column_names, table.columns)
+    }
+
+def _expire_caches():
+    """Clear the analysis cache once it is older than the TTL"""
+    global _cache_cleared_at
+    now = time.monotonic()
+    if now - _cache_cleared_at > CACHE_TTL_SECONDS:
+        _analyze_cached.cache_clear()
+        _cache_cleared_at = now
+
+def _dataset_list_query(dialect: str):
+    """Build a query that returns all dataset summaries as a single JSON array
+    string, or None if the database has no supported JSON aggregation"""
+    if dialect == "postgresql":
+        summary = func.jsonb_build_object(
+            "id", CsvDataset.id,
+            "name", CsvDataset.name,
+            "fileName", CsvDataset.file_name,
+            "uploadedAt", CsvDataset.uploaded_at,
+            "columns", CsvDataset.columns,
+            "rowCount", CsvDataset.row_count
+        )
+        return select(cast(func.jsonb_agg(aggregate_order_by(summary, CsvDataset.uploaded_at.desc())), Text))
+    
+    if dialect != "sqlite":
+        return None
+    
+    # SQLite stores JSON as text, so values are wrapped in json() to embed them as JSON
+    summary = func.json_object(
+        "id", CsvDataset.id,
+        "name", CsvDataset.name,
+        "fileName", CsvDataset.file_name,
+        "uploadedAt", func.replace(CsvDataset.uploaded_at, " ", "T"),
+        "columns", func.json(CsvDataset.columns),
+        "rowCount", CsvDataset.row_count
+    )
+    # SQLite documents the order of json_group_array as arbitrary, and only
+    # supports ORDER BY inside aggregates from 3.44. This relies on its current
+    # behavior of aggregating rows in the order of an ordered subquery.
+    summaries = select(summary.label("summary")).order_by(CsvDataset.uploaded_at.desc()).subquery()
+    return select(func.json_group_array(func.json(summaries.c.summary)))
+
 @router.get("/csv", response_model=ApiResponse)
 async def get_all_csv_datasets(db: Session = Depends(get_db)):
     """Get all CSV datasets"""
-    datasets = db.query(CsvDataset).order_by(CsvDataset.uploaded_at.desc()).all()
+    query = _dataset_list_query(db.bind.dialect.name)
+    if query is not None:
+        # The database builds the JSON, so no per-row Python objects are created
+        data = db.execute(query).scalar() or "[]"
+        return Response(
+            content=f'{{"success":true,"data":{data}}}',
+            media_type="application/json"
+        )
+    
+    datasets = db.query(
+        CsvDataset.id,
+        CsvDataset.name,
+        CsvDataset.file_name,
+        CsvDataset.uploaded_at,
+        CsvDataset.columns,
+        CsvDataset.row_count
+    ).order_by(CsvDataset.uploaded_at.desc()).all()
     return {
         "success": True,
-        "data": [dataset.to_dict() for dataset in datasets]
+        "data": [
+            {
+                "id": dataset.id,
+                "name": dataset.name,
+                "fileName": dataset.file_name,
+                "uploadedAt": dataset.uploaded_at.isoformat(),
+                "columns": dataset.columns,
+                "rowCount": dataset.row_count
+            }
+            for dataset in datasets
+        ]
     }
 
 @router.get("/csv/{dataset_id}", response_model=ApiResponse)
 async def get_csv_dataset_by_id(dataset_id: str, db: Session = Depends(get_db)):
     """Get a CSV dataset by ID"""
-    dataset = db.query(CsvDataset).filter(CsvDataset.id == dataset_id).first()
+    dataset = db.query(
+        CsvDataset.id,
+        CsvDataset.name,
+        CsvDataset.file_name,
+        CsvDataset.uploaded_at,
+        CsvDataset.columns,
+        CsvDataset.row_count,
+        CsvDataset.preview_data
+    ).filter(CsvDataset.id == dataset_id).first()
     if not dataset:
         return {
             "success": False,
             "error": "Dataset not found"
         }
     
+    # Encode the row in a single orjson pass, which also formats the
+    # datetime, instead of building a model dict for FastAPI to encode
+    return Response(
+        content=orjson.dumps({
+            "success": True,
+            "data": {
+                "id": dataset.id,
+                "name": dataset.name,
+                "fileName": dataset.file_name,
+                "uploadedAt": dataset.uploaded_at,
+                "columns": dataset.columns,
+                "rowCount": dataset.row_count,
+                "previewData": dataset.preview_data
+            }
+        }),
+        media_type="application/json"
+    )
+
+@router.get("/csv/{dataset_id}/preview", response_model=ApiResponse)
+async def get_csv_dataset_preview(dataset_id: str, db: Session = Depends(get_db)):
+    """Get the preview rows of a CSV dataset"""
+    preview_data = db.query(CsvDataset.preview_data).filter(CsvDataset.id == dataset_id).scalar()
+    if preview_data is None:
+        return {
+            "success": False,
+            "error": "Dataset not found"
+        }
+    
     return {
         "success": True,
-        "data": dataset.to_dict()
+        "data": preview_data
     }
 
 @router.delete("/csv/{dataset_id}", response_model=ApiResponse)
@@ -56,17 +434,104 @@ async def delete_csv_dataset(dataset_id: str, db: Session = Depends(get_db)):
     db.delete(dataset)
     db.commit()
     
+    # Remove the stored files
+    if dataset.file_path:
+        _remove_file(dataset.file_path)
+        _remove_file(_position_map_path(dataset.file_path))
+    _remove_file(dataset.columnar_path)
+    
+    # Entries can't be evicted by key, so drop the deleted dataset's with the rest
+    _analyze_cached.cache_clear()
+    
     return {
         "success": True,
         "data": {"message": f"Dataset {dataset_id} deleted successfully"}
     }
 
+@router.get("/csv/{dataset_id}/rows", response_model=ApiResponse)
+async def get_csv_dataset_rows(
+    dataset_id: str,
+    start: int = Query(0, ge=0),
+    n: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Get a range of rows from a CSV dataset"""
+    dataset = db.query(CsvDataset).filter(CsvDataset.id == dataset_id).first()
+    if not dataset:
+        return {
+            "success": False,
+            "error": "Dataset not found"
+        }
+    
+    if not dataset.file_path:
+        return {
+            "success": False,
+            "error": "No stored file for this dataset"
+        }
+    
+    try:
+        # Reading and parsing block, so keep them off the event loop
+        rows = await run_in_threadpool(_read_rows, dataset.file_path, dataset.columnar_path, dataset.columns, start, n)
+        
+        return {
+            "success": True,
+            "data": rows
+        }
+    except FileNotFoundError:
+        return {
+            "success": False,
+            "error": "Row index not available for this dataset"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Error reading CSV rows: {str(e)}"
+        }
+
+@router.get("/csv/{dataset_id}/analyze", response_model=ApiResponse)
+async def analyze_csv_dataset(dataset_id: str, db: Session = Depends(get_db)):
+    """Analyze the columns of a CSV dataset"""
+    dataset = db.query(CsvDataset).filter(CsvDataset.id == dataset_id).first()
+    if not dataset:
+        return {
+            "success": False,
+            "error": "Dataset not found"
+        }
+    
+    if not dataset.file_path:
+        return {
+            "success": False,
+            "error": "No stored file for this dataset"
+        }
+    
+    try:
+        _expire_caches()
+        
+        # Keyed by modification time so a replaced file is analyzed again
+        source_path = _source_path(dataset)
+        mtime = os.path.getmtime(source_path)
+        
+        # Parsing and the compute kernels block, so keep them off the event loop
+        column_analysis = await run_in_threadpool(_analyze_cached, source_path, mtime)
+        
+        return {
+            "success": True,
+            "data": column_analysis
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Error analyzing CSV file: {str(e)}"
+        }
+
 @router.post("/csv/upload", response_model=ApiResponse)
 async def upload_csv_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
     """Upload a CSV file and parse it"""
+    file_path = None
     try:
         if not file.filename.endswith('.csv'):
             return {
@@ -74,26 +539,45 @@ async def upload_csv_file(
                 "error": "File must be a CSV"
             }
         
-        # Read file content
-        contents = await file.read()
+        dataset_id = f"csv_{uuid.uuid4()}"
+        
+        # Copy the upload to disk off the event loop, saving the line
+        # offsets so any row can be read without scanning the file
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        file_path = os.path.join(UPLOAD_DIR, f"{dataset_id}.csv")
+        offset_count = await run_in_threadpool(_save_upload, file.file, file_path)
         
-        # Parse CSV using pandas
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        # Parse only the first block for the column names and preview
+        with pacsv.open_csv(file_path, read_options=PREVIEW_READ_OPTIONS) as reader:
+            first_batch = next(iter(reader), None)
+            
+            # Get column names
+            columns = reader.schema.names
+            convert_options = _temporal_as_text(reader.schema)
         
-        # Get column names
-        columns = df.columns.tolist()
+        # Parse again so dates and timestamps keep the text they have in the file
+        if convert_options:
+            with pacsv.open_csv(
+                file_path,
+                read_options=PREVIEW_READ_OPTIONS,
+                convert_options=convert_options
+            ) as reader:
+                first_batch = next(iter(reader), None)
         
-        # Get row count
-        row_count = len(df)
+        # Get row count without parsing the whole file (excluding the header)
+        row_count = max(offset_count - 2, 0)
         
         # Get preview data (first few rows)
-        preview_data = df.head(3).to_dict(orient='records')
+        preview_data = _to_records(first_batch.slice(0, 3)) if first_batch else []
         
         # Create dataset object
+        columnar_path = os.path.join(UPLOAD_DIR, f"{dataset_id}.arrow")
         new_dataset = CsvDataset(
-            id=f"csv_{uuid.uuid4()}",
+            id=dataset_id,
             name=file.filename.replace('.csv', ''),
             file_name=file.filename,
+            file_path=file_path,
+            columnar_path=columnar_path,
             uploaded_at=datetime.now(),
             columns=columns,
             row_count=row_count,
@@ -105,11 +589,18 @@ async def upload_csv_file(
         db.commit()
         db.refresh(new_dataset)
         
+        # Convert to a columnar copy for analysis after responding
+        background_tasks.add_task(_write_columnar, file_path, columnar_path)
+        
         return {
             "success": True,
             "data": new_dataset.to_dict()
         }
     except Exception as e:
+        # Don't leave a partially processed file behind
+        if file_path:
+            _remove_file(file_path)
+            _remove_file(_position_map_path(file_path))
         return {
             "success": False,
             "error": f"Error processing CSV file: {str(e)}"
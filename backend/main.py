@@ -2,7 +2,9 @@
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -12,6 +14,9 @@ from app.routes import postgres_router, dataset_router, validation_router
 # Load environment variables
 load_dotenv()
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create database tables on startup
@@ -23,7 +28,8 @@ app = FastAPI(
     title="Data Validator API",
     description="Backend API for the Data Validator application",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS with settings from environment
@@ -43,12 +49,15 @@ if not allowed_origins or allowed_origins[0] == "":
         "*"  # Allow all origins during development
     ]
 
-print(f"Configuring CORS with allowed origins: {allowed_origins}")
+logger.info("Configuring CORS with allowed origins: %s", allowed_origins)
 
 # Replace CORS middleware with a more permissive one for development
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins during development
+    # Allow all origins during development. A regex makes the middleware echo
+    # the request origin, which credentialed requests (e.g. from GitHub
+    # Codespaces) require instead of "*"
+    allow_origin_regex=".*",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -64,23 +73,19 @@ app.include_router(validation_router, prefix="/api/validation", tags=["Validatio
 async def root():
     return {"message": "Welcome to the Data Validator API"}
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    origin = request.headers.get('origin', 'No origin')
-    print(f"Received request: {request.method} {request.url}")
-    print(f"Origin: {origin}")
-    
-    # Get response from the endpoint
-    response = await call_next(request)
-    print(f"Response status: {response.status_code}")
-    
-    # For GitHub Codespaces, manually set CORS headers for every response
-    response.headers["Access-Control-Allow-Origin"] = origin if origin != 'No origin' else "*"
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, Accept"
-    
-    return response
+# Log each request's origin and status when enabled
+if os.getenv("ACCESS_LOG", "false").lower() == "true":
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        response = await call_next(request)
+        logger.info(
+            "%s %s from %s: %s",
+            request.method,
+            request.url,
+            request.headers.get("origin", "No origin"),
+            response.status_code
+        )
+        return response
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -30,7 +30,7 @@ export interface CsvDataset {
   uploadedAt: string;
   columns: string[];
   rowCount: number;
-  previewData: any[];
+  previewData?: any[];
 }
 
 export type Dataset = PostgresConnection | CsvDataset;